@@ -10,6 +10,29 @@ Revised on Sut May 27 2023
 import numpy as np
 import pandas as pd
 
+
+def _weighted_sum(price, q):
+    """
+    Sum of price * q over time (price is a scalar or given for each time)
+    """
+    if np.ndim(price) == 0:
+        return price * q.sum(axis = -1, dtype = np.float64)
+    else:
+        return q @ price
+
+
+def _kernels():
+    """
+    Compiled kernels: Cython extension "_scm_core" if it is built, numba otherwise
+    (imported on first use, so that numba is needed only for the charging profile)
+    """
+    try:
+        import _scm_core as kernels
+    except ImportError:
+        import _scm_numba as kernels
+    return kernels
+
+
 class ScreeningCurveMethod:  
     """
     Class of Screening Surve Method
@@ -38,6 +61,12 @@ class ScreeningCurveMethod:
         The screening curve method consists of three steps. 
         """
 
+        # Time-dependent prices: selling price is supported only with charging profile
+        if np.ndim(parameter["Pbt"]) != 0:
+            raise ValueError('Buying price "Pbt" must be a scalar.')
+        if np.ndim(parameter["Pst"]) != 0 and profile == False:
+            raise ValueError('Time-dependent selling price "Pst" requires profile=True.')
+
         # Step 1: 
         self.step1_slice(parameter)
             
@@ -45,8 +74,8 @@ class ScreeningCurveMethod:
         Cgrid     = self.cost_grid(parameter)
         Cpv       = self.cost_pv(parameter)
         Cwb, Qbat, Qprof = self.cost_pv_battery(parameter, profile)
-        self.cost_data = pd.concat([Cpv, Cwb, Cgrid], axis = 1)
-        self.cost_data.columns =  ["Cpv", "Cwb", "Cgrid"]              
+        self.cost_data = pd.DataFrame( np.stack([Cpv, Cwb, Cgrid], axis = 1),
+                                       columns = ["Cpv", "Cwb", "Cgrid"] )
         self.Qbat_list = Qbat
 
         # Step 3: Derive optimal capacities of PV and battery
@@ -70,26 +99,32 @@ class ScreeningCurveMethod:
         Step 1: Decompose the load curve into slices
         """        
 
-        # Demand and PV data
-        Dem = self.Dem
-        PV  = self.PV * parameter["Dslice"]
+        # Demand and PV data (slices are stored in single precision)
+        Dem = np.asarray(self.Dem, dtype = np.float32)
+        PV  = np.asarray(self.PV * parameter["Dslice"], dtype = np.float32)
                 
         self.Nslice = parameter["Nslice"]
                 
-        # Initialization of q_load and q_spls
-        q_load = np.zeros([self.Nslice, self.Nday*self.Ntime]) 
-        q_spls = np.zeros([self.Nslice, self.Nday*self.Ntime])
+        # Remaining demand after k slices is max(Dem - k*PV, 0), so the surplus
+        # of slice k is given in closed form by clip((k+1)*PV - Dem, 0, PV)
+        # (computed in place on preallocated arrays to avoid temporaries)
+        q_spls = np.empty([self.Nslice, self.Nday*self.Ntime], dtype = np.float32)
+        q_load = np.empty([self.Nslice, self.Nday*self.Ntime], dtype = np.float32)
+        np.multiply( np.arange(1, self.Nslice+1, dtype = np.float32)[:, None], PV, out = q_spls )
+        np.subtract( q_spls, Dem, out = q_spls )
+        np.clip( q_spls, 0, PV, out = q_spls )   # Take positive part of (PV-Dem)
+        np.subtract( PV, q_spls, out = q_load )
                 
-        # For each slice
-        for i_slice in range(self.Nslice):
-                        
-            q_spls[i_slice] =  ( (PV-Dem) + np.abs(PV-Dem) ) / 2  # Take positive part of (PV-Dem) 
-            q_load[i_slice] =  PV - q_spls[i_slice]
-
-            Dem = Dem - q_load[i_slice]                       
+        # Surplus PV of each slice in (slice, day, time) form and sorted surplus amount per day
+        # (daily amounts of all slices are sorted at once, in place)
+        q_spls_3d      = q_spls.reshape(self.Nslice, self.Nday, self.Ntime)
+        q_spls_per_day = q_spls_3d.sum(axis = 2, dtype = np.float64)
+        q_spls_per_day.sort(axis = 1)
                 
         self.q_load            = q_load
         self.q_spls            = q_spls
+        self.q_spls_3d         = q_spls_3d
+        self.q_spls_per_day    = q_spls_per_day
               
         return q_load, q_spls
     
@@ -106,23 +141,24 @@ class ScreeningCurveMethod:
         Cost_DF         = self.cost_data 
         Qbat_list       = self.Qbat_list   # required battery at each slice 
 
-        # List of least-cost generation technology at each slice        
-        min_gen = Cost_DF.idxmin(axis = 1)        
+        # Least-cost generation technology at each slice (0: Cpv, 1: Cwb, 2: Cgrid)
+        min_gen = Cost_DF[["Cpv", "Cwb", "Cgrid"]].to_numpy().argmin(axis = 1)
+        num_gen = np.bincount(min_gen, minlength = 3)
 
         # Optimal capacity of PV
-        num_PV = sum( min_gen == 'Cpv') + sum( min_gen == 'Cwb' )
+        num_PV = num_gen[0] + num_gen[1]
         opt_PV = num_PV * parameter["Dslice"] 
         
         # Optimal capacity of battery
-        idx_Bat = ( min_gen == 'Cwb' )
-        opt_Bat = sum( Qbat_list[idx_Bat] )        
+        idx_Bat = ( min_gen == 1 )
+        opt_Bat = Qbat_list[idx_Bat].sum()        
         
-        # Charging profile
-        try:
-            Qprof_list = self.q_chg_prof  # charging profile for each slice       
-            chg_prof   = sum( Qprof_list[idx_Bat] )
-        except:
+        # Charging profile (not calculated with profile=False)
+        Qprof_list = self.q_chg_prof  # charging profile for each slice       
+        if Qprof_list is None:
             chg_prof = None
+        else:
+            chg_prof = Qprof_list[idx_Bat].sum(axis = 0, dtype = np.float64)
         
         return opt_PV, opt_Bat, chg_prof
 
@@ -132,13 +168,9 @@ class ScreeningCurveMethod:
         Derive cost curve of "buying from grid" 
         """
                 
-        Cgrid = np.zeros( self.Nslice )  
-
-        for i_slice in range( self.Nslice ):
-
-            Cgrid[i_slice] =  self.W * sum( parameter['Pbt'] * self.q_load[i_slice] )  
+        Cgrid = self.W * _weighted_sum(parameter['Pbt'], self.q_load)
         
-        return  pd.Series(Cgrid)
+        return  Cgrid
 
 
     def cost_pv(self, parameter):
@@ -146,14 +178,9 @@ class ScreeningCurveMethod:
         Derive cost curve of "installing PV"
         """
         
-        Cpv = np.zeros( self.Nslice )
-
-        for i_slice in range( self.Nslice ):
-
-            Cpv[i_slice] = parameter["Cfp"] * parameter["Dslice"] \
-                            - self.W * sum( parameter["Pst"] * self.q_spls[i_slice] )                 
+        Cpv = parameter["Cfp"] * parameter["Dslice"] - self.W * _weighted_sum(parameter["Pst"], self.q_spls)
         
-        return pd.Series(Cpv)   
+        return Cpv   
     
 
     def cost_pv_battery(self, parameter, profile=False):
@@ -165,50 +192,33 @@ class ScreeningCurveMethod:
         # "self.q_bat", "self.q_chg_sum", "self.q_chg_prof" are calculated
         self.battery_capacity_and_charging_profile(parameter,profile)         
         
-        # Initialization
-        Qbat_sum  = 0          
-        Qbat_list = np.zeros(self.Nslice)  # Amount of battery      
-        Cwb_list  = np.zeros(self.Nslice)  # Cost curve 
-
-        # for each slice        
-        for i_slice in range(self.Nslice):
-                      
-            # Check cumulative total amount of battery                            
-            if Qbat_sum < parameter["Mbat"]:
-
-                # Battery capacity for this slice
-                Qbat = self.q_bat[i_slice]                                     
-                Qbat_sum += Qbat   # Update cumulative total amount of battery
-    
-                # Totol amount of charged electricity 
-                Qchg = self.q_chg_sum[i_slice]
-                        
-            else: # Qbat_sum >= MAXIMUM Capacity
-
-                Qchg = 0
-                Qbat = 0
-
-            # Cost calculation
-            W           = self.W
-            p_sell      = parameter["Pst"]            
-
-            if profile == True:
-                q_sell_prof = self.q_spls[i_slice] - self.q_chg_prof[i_slice]                
-                Cwb = parameter["Cfp"] * parameter["Dslice"] + parameter["Cfb"] * Qbat \
-                      - W * sum( p_sell * q_sell_prof )  \
-                      - W * parameter["Pbt"] * parameter["Edis"] *parameter["Echg"]* Qchg       
-            
-            elif profile == False:
-                q_sell_amount = sum(self.q_spls[i_slice]) -self.q_chg_sum[i_slice]
-                Cwb = parameter["Cfp"] * parameter["Dslice"] + parameter["Cfb"] * Qbat \
-                      - W * p_sell * q_sell_amount  \
-                      - W * parameter["Pbt"] * parameter["Edis"] *parameter["Echg"]* Qchg                
-            
-            # Store results                   
-            Qbat_list[i_slice] = Qbat 
-            Cwb_list[i_slice] = Cwb                                  
+        # Parameters
+        Mbat  = parameter["Mbat"]
+        Cfb   = parameter["Cfb"]
+        Cfix  = parameter["Cfp"] * parameter["Dslice"]                                                            # fixed cost of PV for a slice
+        Vsell = self.W * np.asarray(parameter["Pst"], dtype = float)                                              # annual value of sold electricity
+        Vdis  = self.W * np.asarray(parameter["Pbt"], dtype = float) * parameter["Edis"] * parameter["Echg"]      # annual value of charged electricity
+
+        q_bat     = self.q_bat
+        q_chg_sum = self.q_chg_sum
+
+        # Annual revenue from electricity sold at each slice (row sums are computed at once)
+        if profile == True:
+            Rsell = _weighted_sum(Vsell, self.q_spls) - _weighted_sum(Vsell, self.q_chg_prof)
+        elif profile == False:
+            Rsell = Vsell * ( self.q_spls.sum(axis = 1, dtype = np.float64) - q_chg_sum )
+
+        # Battery is installed at a slice while cumulative total amount of battery
+        # up to the previous slice is less than its maximum
+        Qbat_sum  = np.concatenate(( [0], np.cumsum(q_bat[:-1]) ))
+        installed = Qbat_sum < Mbat
+        Qbat_list = np.where(installed, q_bat, 0)       # Amount of battery
+        Qchg_list = np.where(installed, q_chg_sum, 0)   # Total amount of charged electricity
+
+        # Cost calculation
+        Cwb_list = Cfix + Cfb * Qbat_list - Rsell - Vdis * Qchg_list
         
-        return pd.Series(Cwb_list), Qbat_list, self.q_chg_prof
+        return Cwb_list, Qbat_list, self.q_chg_prof
 
 
     
@@ -217,60 +227,28 @@ class ScreeningCurveMethod:
         Estimation of battery capacity and charging profile
         """
         
-        numJ      = np.zeros(self.Nslice)
-        q_bat     = np.zeros(self.Nslice)
-        q_chg_sum = np.zeros(self.Nslice)
-        q_chg = np.zeros([self.Nslice, self.Nday*self.Ntime])
-
-        # for each slice        
-        for i_slice in range(self.Nslice):
-
-            # Profile of surplus PV in matrix form 
-            q_spls_Mat  = np.reshape( self.q_spls[i_slice], (self.Nday, self.Ntime) )
-                                    
-            # Calculate surplus amount per day
-            q_spls_per_day = np.sum(q_spls_Mat, axis = 1)  
-            q_spls_per_day.sort() 
-
-            # Initialization of estimated battery amount and charging profile
-            q_bat_pre = 0
-            q_chg_prof_pre = np.zeros( self.Nday * self.Ntime )
-            q_chg_amt_pre = 0
-            
-            # Check economic benefit of incremental battery installation for each j             
-            for j in range(self.Nday):  
-
-                # Candidate of maximum chargeable amount                           
-                QchgMax = q_spls_per_day[j]             
-                
-                # Calculate economic benefit Bj and charging profile for given j
-                if profile == True:
-                    B, q_chg_prof = self.economic_benefit_w_prof(parameter, q_spls_Mat, QchgMax, 
-                                                                 q_bat_pre, q_chg_prof_pre)   
-                    q_chg_amount = sum(q_chg_prof)
-
-                elif profile == False:                    
-                    B, q_chg_amount = self.economic_benefit_no_prof(parameter, q_spls_Mat, QchgMax, 
-                                                                  q_bat_pre, q_chg_prof_pre, j, q_spls_per_day, q_chg_amt_pre)                    
-                    q_chg_prof = None    
-                    
-                    
-                # Confirm if ther is economic benefit 
-                if B >= 0:
-                    
-                    numJ[i_slice]  = j + 1                     # update J
-                    q_bat_pre      = parameter["Echg"]*QchgMax # update battery capacity for next j
-                    q_chg_prof_pre = q_chg_prof                # update charging profile for next j
-                    q_chg_amt_pre  = q_chg_amount
-                    
-                else:  # break the loop if there is no benfit                     
-                
-                    break
-
-                # Store battery capacity and charging profile
-                q_bat[i_slice] = q_bat_pre   
-                q_chg[i_slice] = q_chg_prof_pre
-                q_chg_sum[i_slice] = q_chg_amt_pre
+        Nslice = self.Nslice
+        Nday   = self.Nday
+        q_spls_per_day = self.q_spls_per_day
+
+        # Economic benefit Bj for all slices and j
+        B, q_bat_diff, q_chg_diff = self.economic_benefit(parameter)
+
+        # J is the first j without economic benefit (Nday if there is no such j)
+        no_benefit = B < 0
+        numJ = np.where( no_benefit.any(axis = 1), no_benefit.argmax(axis = 1), Nday )
+
+        # Battery capacity and charged amount given by j < J
+        benefit   = np.arange(Nday) < numJ[:, None]
+        q_bat     = np.where(benefit, q_bat_diff, 0).sum(axis = 1)
+        q_chg_sum = np.where(benefit, q_chg_diff, 0).sum(axis = 1)
+
+        # Charging profile for the maximum chargeable amount of each slice
+        if profile == True:
+            QchgMax = np.where( numJ > 0, q_spls_per_day[np.arange(Nslice), numJ-1], 0 )
+            q_chg   = _kernels().charging_profile(self.q_spls_3d, QchgMax)
+        else:
+            q_chg   = None
         
         self.numJ       = numJ
         self.q_bat      = q_bat
@@ -281,60 +259,38 @@ class ScreeningCurveMethod:
         return numJ, q_bat, q_chg
 
 
-    def economic_benefit_no_prof(self, parameter, q_spls_Mat, QchgMax, q_bat_pre, q_chg_prof_pre, j, q_spls_per_day, q_chg_amt_pre):
+    def economic_benefit(self, parameter):
+        """
+        Economic benefit Bj by incremental battery capacity for all slices and j
+        (q_spls_per_day is sorted in ascending order for each slice)
+        """
 
-        # amount of electricity charged for given j
+        # Parameters
+        Echg  = parameter["Echg"]
+        Cfb   = parameter["Cfb"]
+        Vsell = self.W * np.asarray(parameter["Pst"], dtype = float)                                 # annual value of sold electricity
+        Vdis  = self.W * np.asarray(parameter["Pbt"], dtype = float) * parameter["Edis"] * Echg      # annual value of charged electricity
+
+        # Charged amount is sum(q_spls_per_day[:j]) + (Nday-j)*QchgMax, so raising QchgMax
+        # from q_spls_per_day[j-1] to q_spls_per_day[j] adds (Nday-j)*(QchgMax - QchgMax_pre) to it
         N = self.Nday
-        q_chg_amount = sum(q_spls_per_day[:j]) + (N-j)*QchgMax
+        j = np.arange(N)
+        QchgMax_diff = np.diff(self.q_spls_per_day, axis = 1, prepend = 0)
+        q_bat_diff   = Echg * QchgMax_diff
+        q_chg_diff   = (N-j) * QchgMax_diff
+
+        # Value of charged electricity that is no longer sold; with time-dependent selling
+        # price it is weighted by the charging profile of each candidate QchgMax
+        if np.ndim(Vsell) == 0:
+            V_chg_diff = Vsell * q_chg_diff
+        else:
+            Vsell = np.ascontiguousarray( np.broadcast_to(Vsell, N*self.Ntime), dtype = np.float64 )
+            V_chg = _kernels().charged_value(self.q_spls_3d, self.q_spls_per_day, Vsell)
+            V_chg_diff = np.diff(V_chg, axis = 1, prepend = 0)
 
         # Calculate economic benefit by incremental battery capacity 
-        W = self.W
-        q_bat_diff = parameter["Echg"]*QchgMax - q_bat_pre
-        q_chg_diff = q_chg_amount - q_chg_amt_pre
-        B = W*parameter["Pbt"]*parameter["Edis"]*parameter["Echg"] * q_chg_diff \
-            - parameter["Cfb"] * q_bat_diff \
-            - W * parameter["Pst"] * q_chg_diff 
-    
-        return B, q_chg_amount
+        B = Vdis * q_chg_diff - Cfb * q_bat_diff - V_chg_diff
 
-
-    def economic_benefit_w_prof(self, parameter, q_spls_Mat, QchgMax, q_bat_pre, q_chg_prof_pre):
-
-        # Initialization of charging profile in matrix form
-        q_chg_Mat = np.zeros([self.Nday,self.Ntime])
-        
-        # Calculate charging profile for given j   
-        for day in range(0, self.Nday):
-
-            # Initialization of daily battery usage
-            total_chg = 0 
-            flag_full = False
-            
-            # Calculate charging amoung for each time
-            for time, pv_surplus in enumerate( q_spls_Mat[day] ):                                
-                
-                if flag_full == False:  # if not battery is full                            
-
-                    if total_chg + pv_surplus >= QchgMax: # if battery to be full
-                        flag_full = True
-                        q_chg_Mat[day][time] = QchgMax - total_chg
-                    else:
-                        q_chg_Mat[day][time] = pv_surplus
-                    
-                    total_chg = total_chg + pv_surplus
-                        
-                else:  # if battery is already full
-                    q_chg_Mat[day][time] = 0                                                            
-        q_chg_prof = q_chg_Mat.ravel()                
-
-        # Calculate economic benefit by incremental battery capacity 
-        W = self.W
-        q_bat_diff = parameter["Echg"]*QchgMax - q_bat_pre
-        q_chg_diff = q_chg_prof - q_chg_prof_pre
-        B = W*parameter["Pbt"]*parameter["Edis"]*parameter["Echg"] * sum(q_chg_diff) \
-            - parameter["Cfb"] * q_bat_diff \
-            - W * sum( parameter["Pst"] * q_chg_diff ) 
-    
-        return B, q_chg_prof
+        return B, q_bat_diff, q_chg_diff
 
 
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+# cython: language_level=3, boundscheck=False, wraparound=False, cdivision=True
+# distutils: extra_compile_args = -O3 -fopenmp
+# distutils: extra_link_args = -fopenmp
+"""
+Compiled kernel of Screening Curve Method(SCM) for deployments without numba.
+
+Build in place with:  cythonize -i _scm_core.pyx
+ScreeningCurveMethod uses this module if it is built and falls back to numba otherwise.
+"""
+import numpy as np
+from cython.parallel cimport prange
+
+
+def charging_profile(const float[:, :, ::1] q_spls_3d, const double[::1] QchgMax):
+    """
+    Charging profile of all slices for given maximum chargeable amount per day
+    """
+    cdef Py_ssize_t Nslice = q_spls_3d.shape[0]
+    cdef Py_ssize_t Nday   = q_spls_3d.shape[1]
+    cdef Py_ssize_t Ntime  = q_spls_3d.shape[2]
+    cdef Py_ssize_t i_slice, day, time
+    cdef double total_chg, q_chg_now
+
+    q_chg_arr = np.zeros((Nslice, Nday*Ntime), dtype=np.float32)
+    cdef float[:, ::1] q_chg = q_chg_arr
+
+    # for each slice (in parallel)
+    for i_slice in prange(Nslice, nogil=True, schedule='static'):
+        for day in range(Nday):
+
+            # Initialization of daily battery usage
+            total_chg = 0.0
+
+            # Charge surplus PV until the battery is full
+            for time in range(Ntime):
+                if total_chg >= QchgMax[i_slice]:  # if battery is already full
+                    break
+                q_chg_now = min(q_spls_3d[i_slice, day, time], QchgMax[i_slice] - total_chg)
+                q_chg[i_slice, day*Ntime + time] = <float>q_chg_now
+                total_chg = total_chg + q_chg_now
+
+    return q_chg_arr
+
+
+def charged_value(const float[:, :, ::1] q_spls_3d, const double[:, ::1] q_spls_per_day, const double[::1] Vsell):
+    """
+    Annual value of charged electricity at time-dependent selling price Vsell
+    for all slices and candidates QchgMax = q_spls_per_day[:, j]
+    """
+    cdef Py_ssize_t Nslice = q_spls_3d.shape[0]
+    cdef Py_ssize_t Nday   = q_spls_3d.shape[1]
+    cdef Py_ssize_t Ntime  = q_spls_3d.shape[2]
+    cdef Py_ssize_t i_slice, j, day, time
+    cdef double QchgMax, total_chg, q_chg_now
+
+    V_chg_arr = np.zeros((Nslice, Nday), dtype=np.float64)
+    cdef double[:, ::1] V_chg = V_chg_arr
+
+    # for each slice (in parallel)
+    for i_slice in prange(Nslice, nogil=True, schedule='static'):
+        for j in range(Nday):
+            QchgMax = q_spls_per_day[i_slice, j]
+            for day in range(Nday):
+
+                # Initialization of daily battery usage
+                total_chg = 0.0
+
+                # Charge surplus PV until the battery is full
+                for time in range(Ntime):
+                    if total_chg >= QchgMax:  # if battery is already full
+                        break
+                    q_chg_now = min(q_spls_3d[i_slice, day, time], QchgMax - total_chg)
+                    V_chg[i_slice, j] = V_chg[i_slice, j] + Vsell[day*Ntime + time] * q_chg_now
+                    total_chg = total_chg + q_chg_now
+
+    return V_chg_arr
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""
+Compiled kernel of Screening Curve Method(SCM) with numba.
+
+ScreeningCurveMethod uses this module only if the Cython extension "_scm_core" is not built.
+"""
+import numpy as np
+from numba import njit, prange
+
+
+@njit(parallel=True, cache=True)
+def charging_profile(q_spls_3d, QchgMax):
+    """
+    Charging profile of all slices for given maximum chargeable amount per day
+    """
+    Nslice, Nday, Ntime = q_spls_3d.shape
+    q_chg = np.zeros((Nslice, Nday*Ntime), dtype=np.float32)
+
+    # for each slice (in parallel)
+    for i_slice in prange(Nslice):
+        for day in range(Nday):
+
+            # Initialization of daily battery usage
+            total_chg = 0.0
+
+            # Charge surplus PV until the battery is full
+            for time in range(Ntime):
+                if total_chg >= QchgMax[i_slice]:  # if battery is already full
+                    break
+                q_chg_now = min(q_spls_3d[i_slice, day, time], QchgMax[i_slice] - total_chg)
+                q_chg[i_slice, day*Ntime + time] = q_chg_now
+                total_chg += q_chg_now
+
+    return q_chg
+
+
+@njit(parallel=True, cache=True)
+def charged_value(q_spls_3d, q_spls_per_day, Vsell):
+    """
+    Annual value of charged electricity at time-dependent selling price Vsell
+    for all slices and candidates QchgMax = q_spls_per_day[:, j]
+    """
+    Nslice, Nday, Ntime = q_spls_3d.shape
+    V_chg = np.zeros((Nslice, Nday))
+
+    # for each slice (in parallel)
+    for i_slice in prange(Nslice):
+        for j in range(Nday):
+            QchgMax = q_spls_per_day[i_slice, j]
+            for day in range(Nday):
+
+                # Initialization of daily battery usage
+                total_chg = 0.0
+
+                # Charge surplus PV until the battery is full
+                for time in range(Ntime):
+                    if total_chg >= QchgMax:  # if battery is already full
+                        break
+                    q_chg_now = min(q_spls_3d[i_slice, day, time], QchgMax - total_chg)
+                    V_chg[i_slice, j] += Vsell[day*Ntime + time] * q_chg_now
+                    total_chg += q_chg_now
+
+    return V_chg